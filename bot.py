@@ -1,14 +1,19 @@
 # main_bot.py
+import asyncio
+import concurrent.futures
+import io
 import logging
 import os
+import queue
 import re
-import requests
-import telebot
-from telebot import types
+import aiofiles
+import aiohttp
+from telebot.async_telebot import AsyncTeleBot
+from collections import OrderedDict
+from dataclasses import dataclass
 from urllib.parse import urlparse
-from time import time
+from time import time, monotonic
 import config  # Import the config file
-from math import ceil
 
 # Configure logging
 logging.basicConfig(
@@ -18,7 +23,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Initialize bot with the token from config
-bot = telebot.TeleBot(config.TOKEN)
+bot = AsyncTeleBot(config.TOKEN)
 
 # Global settings (Can be persistent if you want)
 settings = {
@@ -28,14 +33,166 @@ settings = {
     "upload_type": "media",
 }
 
-# Dictionary to store file downloading progress data
-downloading_progress = {}
+@dataclass(slots=True)
+class DLState:
+    """Per-download progress counters, mutated by the write loop."""
+
+    inv_total: float
+    progress_msg_id: int
+    last_time: float
+    downloaded: int = 0
+    last_reported: int = 0
+    last_downloaded: int = 0
+    ema_speed: float = 0.0
+    last_text: str = ""
+
+
+# Progress state per download, keyed by (chat_id, message_id) so identical
+# filenames from different users cannot clobber each other. Bounded LRU:
+# abandoned entries are evicted oldest-first.
+downloading_progress = OrderedDict()
+_MAX_PROGRESS_ENTRIES = 1024
+
+# Where downloads land; created once at import so the hot path never has
+# to re-check it.
+_DL_DIR = "downloads"
+os.makedirs(_DL_DIR, exist_ok=True)
+
+# Minimum bytes accumulated before a disk write; bursts of small socket
+# reads are coalesced up to this size so the disk sees fewer, larger writes.
+CHUNK_SIZE = 256 * 1024
+
+# Seconds between progress message edits; one edit per tick keeps us well
+# under Telegram's per-bot message rate limit.
+PROGRESS_UPDATE_INTERVAL = 3.0
+
+# Global cap on message edits per second across all downloads, kept below
+# Telegram's 30 msg/sec bot limit.
+_EDIT_RATE_LIMIT = 25
+
+# Latest pending edit text per (chat_id, message_id); the dispatcher always
+# sends the newest text and drops superseded ones.
+_pending_edits = {}
+_edit_queue = asyncio.Queue()
+_dispatcher_task = None
+
+# Telegram file_path results stay valid for about an hour; cache them so a
+# re-sent document skips the extra getFile round-trip.
+_FILE_PATH_TTL = 1800
+_FILE_PATH_CACHE_MAX = 4096
+_file_path_cache = {}
+
+# All 11 possible progress bar states, precomputed once.
+_BARS = tuple("▰" * i + "▢" * (10 - i) for i in range(11))
+
+# Fixed template for progress messages; only the fields vary per update.
+_PROGRESS_TMPL = (
+    "Downloading...\n"
+    "[{bar}] {pct:.2f}%\n"
+    "Processed: {proc} of {tot}\n"
+    "Speed: {spd} | ETA: {eta}"
+)
+
+# Translation table that strips characters invalid in filenames.
+_INVALID_CHARS = str.maketrans('', '', '<>:"/\\|?*')
+
+# Detector for download links sent as plain text.
+_URL_RE = re.compile(r'https?://\S+')
+
+# Extensions we accept as-is; anything else gets a .txt suffix.
+_EXT_SET = frozenset({
+    '.jpg', '.jpeg', '.png', '.pdf', '.txt', '.mp4', '.avi', '.mkv', '.mov',
+    '.mp3', '.wav', '.ogg', '.zip', '.rar', '.doc', '.docx', '.xls', '.xlsx',
+    '.ppt', '.pptx',
+})
+
+# Uploads above this size read through a pooled buffer instead of letting
+# each request allocate fresh chunk buffers.
+_LARGE_UPLOAD_THRESHOLD = 20 * 1024 * 1024
+_UPLOAD_BUF_SIZE = 1024 * 1024
+_BUF_POOL = queue.LifoQueue(maxsize=8)
+
+
+class _BufferedUpload(io.RawIOBase):
+    """Raw reader for large uploads backed by a pooled 1 MiB buffer.
+
+    Deriving from io.RawIOBase keeps aiohttp's payload registry happy (it
+    serializes IOBase objects via executor-backed reads); read() fills a
+    recycled buffer straight from the unbuffered file descriptor, so
+    concurrent large uploads share a handful of buffers instead of each
+    allocating their own per read.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self._file = open(path, "rb", buffering=0)
+        try:
+            self._buf = _BUF_POOL.get_nowait()
+        except queue.Empty:
+            self._buf = bytearray(_UPLOAD_BUF_SIZE)
+        self._view = memoryview(self._buf)
+        self.name = path
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._file.readinto(b)
+
+    def read(self, n=-1):
+        if n < 0 or n > _UPLOAD_BUF_SIZE:
+            n = _UPLOAD_BUF_SIZE
+        got = self._file.readinto(self._view[:n])
+        if not got:
+            return b""
+        return bytes(self._view[:got])
+
+    def close(self):
+        if self._buf is not None:
+            self._view.release()
+            try:
+                _BUF_POOL.put_nowait(self._buf)
+            except queue.Full:
+                pass
+            self._buf = None
+        self._file.close()
+        super().close()
+
+
+# Pool for blocking filesystem calls; local disk I/O cannot be made
+# non-blocking on the event loop itself.
+_IO_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+
+async def _run_blocking(func, *args):
+    """Runs a blocking filesystem call on the I/O pool."""
+    return await asyncio.get_running_loop().run_in_executor(_IO_POOL, func, *args)
+
+
+# Single shared HTTP session so concurrent downloads pool their connections.
+# Created lazily because a ClientSession must be built inside a running loop.
+_http_session = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Returns the shared aiohttp session, creating it on first use."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300),
+            # No total deadline: multi-GB downloads legitimately run for
+            # hours. Stalled connects/reads still time out.
+            timeout=aiohttp.ClientTimeout(
+                total=None, sock_connect=30, sock_read=60
+            ),
+        )
+    return _http_session
 
 
 @bot.message_handler(commands=["start"])
-def start(message):
+async def start(message):
     """Sends a welcome message with instructions."""
-    bot.reply_to(
+    await bot.reply_to(
         message,
         "Hi! I'm an Auto Rename Bot.\n\n"
         "Send me a file or a download link, and I'll rename and send it back to you.\n\n"
@@ -45,7 +202,7 @@ def start(message):
 
 
 @bot.message_handler(commands=["settings"])
-def settings_command(message):
+async def settings_command(message):
     """Displays current settings."""
     message_text = (
         "Current Settings:\n\n"
@@ -55,31 +212,26 @@ def settings_command(message):
         f"Upload Type: {settings['upload_type']}\n\n"
         "Use /rename_mode to change rename mode."
     )
-    bot.reply_to(message, message_text)
+    await bot.reply_to(message, message_text)
 
 
 @bot.message_handler(commands=["rename_mode"])
-def rename_mode_command(message):
+async def rename_mode_command(message):
     """Allows user to set rename mode."""
     args = message.text.split()[1:]
     if args and args[0].lower() in ["manual", "auto"]:
         settings["rename_mode"] = args[0].lower()
-        bot.reply_to(message, f"Rename mode set to {settings['rename_mode']}.")
+        await bot.reply_to(message, f"Rename mode set to {settings['rename_mode']}.")
     else:
-        bot.reply_to(
+        await bot.reply_to(
             message, "Invalid rename mode. Use /rename_mode manual or /rename_mode auto"
         )
 
 
 def sanitize_filename(filename):
     """Sanitizes the filename by removing or replacing invalid characters"""
-    # Define a regular expression to match invalid filename characters
-    invalid_chars = r'[<>:"/\\|?*]'
-    # Remove or replace invalid characters
-    filename = re.sub(invalid_chars, '', filename)
-    # Truncate very long filenames
-    filename = filename[:200]  # Ensure filepaths on all OS are under 255 chars
-    return filename
+    # Strip invalid characters and truncate very long filenames
+    return filename.translate(_INVALID_CHARS)[:200]  # Ensure filepaths on all OS are under 255 chars
 
 
 def format_size(size_bytes):
@@ -93,50 +245,117 @@ def format_size(size_bytes):
     else:
         return f"{size_bytes / 1024**3:.2f} GiB"
 
-def progress_bar_callback(current_bytes, total_bytes, message, filename: str):
+def progress_bar_callback(current_bytes, total_bytes, chat_id, key):
     """Callback function to show a complete progress bar for downloading.
 
     Args:
         current_bytes (int): The number of bytes downloaded so far.
         total_bytes (int): The total size of the file to be downloaded.
-        message (types.Message): The Telegram message object.
-        filename (str): The filename of the file being downloaded.
+        chat_id (int): The chat the progress message lives in.
+        key (tuple): The (chat_id, message_id) key of the download.
     """
-    if filename not in downloading_progress:
-        downloading_progress[filename] = {
-            "start_time": time(),
-            "prev_percentage": 0,
-        }
-
-    percent = int(current_bytes / total_bytes * 100)
-    if percent > downloading_progress[filename]["prev_percentage"]:
-        downloading_progress[filename]["prev_percentage"] = percent
-        elapsed_time = time() - downloading_progress[filename]["start_time"]
-        speed = current_bytes / elapsed_time if elapsed_time else 0
-        if speed>0:
-          eta_seconds = (total_bytes - current_bytes) / speed
-        else:
-          eta_seconds = 0
-        
-        eta = format_time(eta_seconds)
-        processed = format_size(current_bytes)
-        total = format_size(total_bytes)
-        speed_formatted = format_size(speed)+"/s"
-
-        progress_bar = "▰" * (percent // 10) + "▢" * (10 - (percent // 10))
-        msg = (
-            f"Downloading...\n"
-            f"[{progress_bar}] {percent:.2f}%\n"
-            f"Processed: {processed} of {total}\n"
-            f"Speed: {speed_formatted} | ETA: {eta}"
-        )
-        if percent == 100:
-            msg += "\nFinished downloading!"
-        bot.edit_message_text(
-            text=msg,
-            chat_id=message.chat.id,
-            message_id=message.message_id + 1,
-        )
+    state = downloading_progress[key]
+    # Clamp: auto-decompressed bodies can exceed the compressed
+    # Content-Length, and >100% would walk off the _BARS table.
+    percent = min(int(current_bytes * state.inv_total), 100)
+    speed = state.ema_speed
+    if speed>0:
+      eta_seconds = (total_bytes - current_bytes) / speed
+    else:
+      eta_seconds = 0
+
+    eta = format_time(eta_seconds)
+    processed = format_size(current_bytes)
+    total = format_size(total_bytes)
+    speed_formatted = format_size(speed)+"/s"
+
+    msg = _PROGRESS_TMPL.format(
+        bar=_BARS[percent // 10],
+        pct=percent,
+        proc=processed,
+        tot=total,
+        spd=speed_formatted,
+        eta=eta,
+    )
+    if percent == 100:
+        msg += "\nFinished downloading!"
+    # Skip the edit entirely when nothing visible changed.
+    if msg == state.last_text:
+        return
+    state.last_text = msg
+    _queue_edit(chat_id, state.progress_msg_id, msg)
+
+
+def _queue_edit(chat_id, message_id, text):
+    """Queues a message edit, keeping only the newest text per message."""
+    key = (chat_id, message_id)
+    if key not in _pending_edits:
+        _edit_queue.put_nowait(key)
+    _pending_edits[key] = text
+
+
+async def _progress_dispatcher():
+    """Single consumer that sends queued edits at a bounded rate.
+
+    Pops at most _EDIT_RATE_LIMIT edits per second, so concurrent
+    downloads can never push the bot into Telegram's 429 backoff.
+    """
+    min_interval = 1 / _EDIT_RATE_LIMIT
+    while True:
+        key = await _edit_queue.get()
+        text = _pending_edits.pop(key, None)
+        if text is None:
+            continue
+        started = time()
+        try:
+            await bot.edit_message_text(
+                text=text, chat_id=key[0], message_id=key[1]
+            )
+        except Exception as e:
+            logger.warning(f"Progress edit failed for message {key[1]}: {e}")
+        elapsed = time() - started
+        await asyncio.sleep(max(0.0, min_interval - elapsed))
+
+
+def _ensure_dispatcher():
+    """Starts the edit dispatcher task if it is not already running."""
+    global _dispatcher_task
+    if _dispatcher_task is None or _dispatcher_task.done():
+        _dispatcher_task = asyncio.create_task(_progress_dispatcher())
+
+
+async def progress_updater(chat_id, key, total_bytes: int):
+    """Background task that reports progress for one in-flight download.
+
+    Wakes every few seconds, reads the byte counter that the write loop
+    maintains, and queues at most one message edit per tick so the write
+    loop itself never touches the Telegram API.
+    """
+    try:
+        while True:
+            await asyncio.sleep(PROGRESS_UPDATE_INTERVAL)
+            state = downloading_progress.get(key)
+            if state is None:
+                return
+            current = state.downloaded
+            if current == state.last_reported:
+                continue
+            # Exponential moving average over tick-sized samples tracks
+            # speed changes instead of the lagging since-start average.
+            now = monotonic()
+            elapsed = now - state.last_time
+            if elapsed > 0:
+                instant_speed = (current - state.last_downloaded) / elapsed
+                if state.ema_speed:
+                    state.ema_speed = 0.2 * instant_speed + 0.8 * state.ema_speed
+                else:
+                    state.ema_speed = instant_speed
+            state.last_downloaded = current
+            state.last_time = now
+            state.last_reported = current
+            progress_bar_callback(current, total_bytes, chat_id, key)
+    except asyncio.CancelledError:
+        pass
 def format_time(seconds):
   """Formats seconds to hours, minutes, and seconds"""
   if seconds < 60:
@@ -151,10 +370,15 @@ def format_time(seconds):
      seconds = seconds % 60
      return f"{hours:.0f}h {minutes:.0f}m {seconds:.0f}s"
 
-def download_file(
+async def download_file(
     message, file_url: str, new_file_name: str = None
-) -> str | None:
-    """Downloads a file from a URL and returns the local path to it."""
+) -> tuple[str, str] | None:
+    """Downloads a file from a URL.
+
+    Returns (local path, display filename), or None on failure. The local
+    path is unique per request; the display filename is what the user
+    should see at upload time.
+    """
     try:
         parsed_url = urlparse(file_url)
         # Try to use original filename, otherwise a generic name
@@ -166,11 +390,12 @@ def download_file(
             filename = sanitize_filename(filename)
         if not filename:
             filename = "downloaded_file"
-        
-        if not filename.lower().endswith(('.jpg','.jpeg', '.png', '.pdf', '.txt', '.mp4', '.avi', '.mkv', '.mov', '.mp3', '.wav', '.ogg', '.zip', '.rar','.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx')):
+
+        if os.path.splitext(filename)[1].lower() not in _EXT_SET:
             filename = filename+".txt"
 
-        with requests.get(file_url, stream=True) as r:
+        session = await get_http_session()
+        async with session.get(file_url) as r:
             r.raise_for_status()
             total_size = int(r.headers.get("content-length", 0))
             downloaded = 0
@@ -179,45 +404,108 @@ def download_file(
             msg = f"Downloading {filename}..."
             if total_size:
                 msg += f"\nSize: {format_size(total_size)}"
-            progress_msg = bot.send_message(
+            progress_msg = await bot.send_message(
                 chat_id=message.chat.id, text=msg
             )
 
-            # Construct the local file path
-            local_filename = os.path.join("downloads", filename)
-            os.makedirs(os.path.dirname(local_filename), exist_ok=True)  # Ensure directory exists
+            # Construct the local file path. The (chat_id, message_id)
+            # prefix keeps concurrent downloads of identically named files
+            # from sharing a path; the user never sees the on-disk name.
+            local_filename = os.path.join(
+                _DL_DIR, f"{message.chat.id}_{message.message_id}_{filename}"
+            )
 
-            with open(local_filename, "wb") as f:
-                for chunk in r.iter_content(chunk_size=1024 * 1024):
-                    if chunk:
-                        f.write(chunk)
+            updater = None
+            if total_size:
+                key = (message.chat.id, message.message_id)
+                state = DLState(
+                    inv_total=100.0 / total_size,
+                    progress_msg_id=progress_msg.message_id,
+                    last_time=monotonic(),
+                )
+                downloading_progress[key] = state
+                downloading_progress.move_to_end(key)
+                while len(downloading_progress) > _MAX_PROGRESS_ENTRIES:
+                    downloading_progress.popitem(last=False)
+                _ensure_dispatcher()
+                updater = asyncio.create_task(
+                    progress_updater(message.chat.id, key, total_size)
+                )
+
+            try:
+                async with aiofiles.open(
+                    local_filename, "wb", executor=_IO_POOL
+                ) as f:
+                    if total_size and hasattr(os, "posix_fallocate"):
+                        # Reserve the extents up front: sequential writes
+                        # are faster and disk-full fails now, not minutes
+                        # into the transfer.
+                        try:
+                            # aiofiles proxies fileno() synchronously
+                            fd = f.fileno()
+                            await _run_blocking(
+                                os.posix_fallocate, fd, 0, total_size
+                            )
+                        except OSError as e:
+                            logger.warning(
+                                f"Could not preallocate {filename}: {e}"
+                            )
+                    # iter_any yields everything already buffered per read,
+                    # so a burst of packets costs one iteration, not many.
+                    # Small reads are coalesced into CHUNK_SIZE disk writes.
+                    buf = bytearray()
+                    async for chunk in r.content.iter_any():
+                        if not chunk:
+                            continue
+                        buf += chunk
                         downloaded += len(chunk)
                         if total_size:
-                          progress_bar_callback(downloaded, total_size, message, filename)
+                            state.downloaded = downloaded
+                        if len(buf) >= CHUNK_SIZE:
+                            await f.write(buf)
+                            buf.clear()
+                    if buf:
+                        await f.write(buf)
+            finally:
+                if updater:
+                    updater.cancel()
         if total_size:
-          del downloading_progress[filename]
+          downloading_progress.pop(key, None)
         # Delete progress message if download complete
         if total_size:
-            bot.delete_message(
+            await bot.delete_message(
                 chat_id=message.chat.id, message_id=progress_msg.message_id
             )
-        return local_filename
-    except requests.exceptions.RequestException as e:
+        return local_filename, filename
+    except aiohttp.ClientError as e:
         logger.error(f"Error downloading from {file_url}: {e}")
-        bot.reply_to(
+        await bot.reply_to(
             message, f"Sorry, could not download the file from {file_url}."
         )
         return None
     except Exception as e:
         logger.error(f"Unexpected error downloading file: {e}")
-        bot.reply_to(
+        await bot.reply_to(
             message, "An unexpected error occurred while downloading the file."
         )
         return None
 
 
+async def _resolve_file_path(file_id: str) -> str:
+    """Returns the Telegram file_path for a file_id, with a TTL cache."""
+    now = time()
+    cached = _file_path_cache.get(file_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    file_path = (await bot.get_file(file_id)).file_path
+    if len(_file_path_cache) >= _FILE_PATH_CACHE_MAX:
+        _file_path_cache.clear()
+    _file_path_cache[file_id] = (file_path, now + _FILE_PATH_TTL)
+    return file_path
+
+
 @bot.message_handler(func=lambda message: True, content_types=["text", "document"])
-def process_file(message):
+async def process_file(message):
     """Handles incoming files or links."""
 
     message_text = message.text
@@ -231,14 +519,14 @@ def process_file(message):
             if len(splitted_message)>1:
                file_name_from_message = splitted_message[1]
         try:
-          file_path = bot.get_file(file_id).file_path
+          file_path = await _resolve_file_path(file_id)
           file_url = f"https://api.telegram.org/file/bot{config.TOKEN}/{file_path}"
         except Exception as e:
             logger.error(f"Error getting file path from bot: {e}")
-            bot.reply_to(message, "Sorry, could not process the file from telegram.")
+            await bot.reply_to(message, "Sorry, could not process the file from telegram.")
             return
 
-    elif message_text and re.match(r'https?://\S+', message_text):
+    elif message_text and _URL_RE.match(message_text):
         splitted_message = message.text.split(" ", 1)
         if len(splitted_message) > 1:
             file_url = splitted_message[0]
@@ -246,30 +534,32 @@ def process_file(message):
         else:
             file_url = splitted_message[0]
     else:
-        bot.reply_to(message, "Please send a file or a valid download link.")
+        await bot.reply_to(message, "Please send a file or a valid download link.")
         return
 
     if file_url:
         if not isinstance(file_url, str):
-            bot.reply_to(message, "Please send a valid download link or file.")
+            await bot.reply_to(message, "Please send a valid download link or file.")
             return
-        local_file_path = download_file(message, file_url, file_name_from_message)
+        downloaded = await download_file(message, file_url, file_name_from_message)
     else:
-        local_file_path = file_url
+        downloaded = None
 
-    if local_file_path is None:
+    if downloaded is None:
         return
+    local_file_path, filename = downloaded
 
     try:
         # Rename Logic
-        filename = os.path.basename(local_file_path)
         file_ext = os.path.splitext(filename)[1]
+        file_ext_lower = file_ext.lower()
         if settings["rename_mode"] == "manual":
            if file_name_from_message:
                 renamed_file = sanitize_filename(file_name_from_message)
            else:
                renamed_file = sanitize_filename(filename)
-           if not renamed_file.lower().endswith(file_ext.lower()):
+           renamed_ext = os.path.splitext(renamed_file)[1].lower()
+           if renamed_ext != file_ext_lower:
                 renamed_file += file_ext
         elif settings["rename_mode"] == "auto":
             renamed_file = sanitize_filename(filename)
@@ -278,35 +568,41 @@ def process_file(message):
             if settings["suffix"]:
                 renamed_file = f"{renamed_file}{settings['suffix']}"
 
-        renamed_file_path = os.path.join("downloads",renamed_file)
-        os.rename(local_file_path,renamed_file_path)
-        
-        # Upload File
+        # Upload File. Telegram shows the recipient the visible_file_name
+        # we pass, so the file never needs to be renamed on disk.
         try:
             if settings["upload_type"] == "media":
-                with open(renamed_file_path, "rb") as f:
-                    bot.send_document(
+                # Large uploads read through the pooled buffer; smaller
+                # ones keep a plain 1 MiB buffered handle.
+                large = os.path.getsize(local_file_path) > _LARGE_UPLOAD_THRESHOLD
+                opener = (
+                    _BufferedUpload(local_file_path)
+                    if large
+                    else open(local_file_path, "rb", buffering=_UPLOAD_BUF_SIZE)
+                )
+                with opener as f:
+                    await bot.send_document(
                         chat_id=message.chat.id,
                         document=f,
-                        filename=renamed_file,
+                        visible_file_name=renamed_file,
                     )
         except Exception as upload_error:
             logger.error(f"Error during upload: {upload_error}")
-            bot.reply_to(
+            await bot.reply_to(
                 message, "Error uploading the file. Please try again."
             )
             return
 
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
-        bot.reply_to(message, "An unexpected error occurred.")
+        await bot.reply_to(message, "An unexpected error occurred.")
     finally:
-        if local_file_path and os.path.exists(renamed_file_path):
-          os.remove(renamed_file_path)
+        if local_file_path and os.path.exists(local_file_path):
+          await _run_blocking(os.remove, local_file_path)
 
 def main():
     """Start the bot."""
-    bot.infinity_polling()
+    asyncio.run(bot.polling())
 
 
 if __name__ == "__main__":